@@ -1,7 +1,8 @@
 import argparse 
 import os 
-from typing import Collection
+from typing import Collection, Optional
 
+from matplotlib import animation
 import numpy as np 
 import numpy.random as npr
 import tqdm 
@@ -20,10 +21,11 @@ parser = argparse.ArgumentParser()
 parser.add_argument_group("visualizations")
 parser.add_argument("--animate", action="store_true", help="render and save an animation of the simulation.")
 
-def main(args): 
-    # logging 
-    experiment_directory: os.PathLike = setup_experiment_directory("basic")
-    log = setup_logger(__name__, custom_handle=os.path.join(experiment_directory, "log.out"))
+parser.add_argument_group("parallelism")
+parser.add_argument("--num_envs", type=int, default=1, help="number of independently seeded simulations to run in parallel.")
+
+def make_simulator(seed: Optional[int]=None, experiment_directory: Optional[os.PathLike]=None) -> Simulator: 
+    rng: npr.Generator = npr.default_rng(seed)
 
     # initialize the house
     room_width: float = 5.0 * METER 
@@ -34,7 +36,7 @@ def main(args):
     # initialize cats 
     keesa_config: CatConfig = CatConfig(
         name="Keesa", 
-        initial_position=np.array([npr.uniform(-room_width / 2., room_width / 2.), npr.uniform(-room_height / 2., room_height / 2.)]), 
+        initial_position=np.array([rng.uniform(-room_width / 2., room_width / 2.), rng.uniform(-room_height / 2., room_height / 2.)]), 
         controller=RangingOracleController()
     )
     keesa: Cat = Cat(keesa_config)
@@ -50,20 +52,45 @@ def main(args):
     lasers: Collection[Laser] = [laser]
 
     # intialize simulator 
-    simulator: Simulator = Simulator(house, cats, lasers, experiment_directory)
-    log.info("configured simulator...")
+    return Simulator(house, cats, lasers, experiment_directory)
+
+def main(args): 
+    # logging 
+    experiment_directory: os.PathLike = setup_experiment_directory("basic")
+    log = setup_logger(__name__, custom_handle=os.path.join(experiment_directory, "log.out"))
     num_steps: int = 50
 
-    for _ in tqdm.tqdm(range(num_steps)): 
-        simulator.step(save_render_artifacts=True)
+    if args.num_envs > 1: 
+        log.info(f"simulating {args.num_envs} environments in parallel...")
+        final_states = Simulator.run_batch(make_simulator, args.num_envs, num_steps)
 
-    log.info("finished simulation...")
+        for seed, (cat_positions, laser_positions) in enumerate(final_states): 
+            log.info(f"seed {seed}: cat positions: {cat_positions.tolist()}, laser positions: {laser_positions.tolist()}")
+
+        log.info("finished simulation...")
+        return
+
+    simulator: Simulator = make_simulator(experiment_directory=experiment_directory)
+    log.info("configured simulator...")
 
     if args.animate: 
+        # frames are streamed to ffmpeg as they're simulated
         log.info("rendering animation")
-        simulator.create_animation()
+        writer: animation.FFMpegWriter = animation.FFMpegWriter(fps=30, extra_args=['-vcodec', 'libx264'])
+
+        with writer.saving(simulator.frame_figure, os.path.join(experiment_directory, "animation.mp4"), dpi=80): 
+            for _ in tqdm.tqdm(range(num_steps)): 
+                simulator.step(stream_writer=writer)
+
         log.info("finished animation")
+    else: 
+        for _ in tqdm.tqdm(range(num_steps)): 
+            simulator.step()
+
+    log.info("finished simulation...")
 
 if __name__=="__main__": 
     args = parser.parse_args()
+    if args.animate and (args.num_envs > 1): 
+        parser.error("--animate is only supported with --num_envs 1")
     main(args)
\ No newline at end of file
@@ -6,7 +6,7 @@ import matplotlib.pyplot as plt
 import numpy as np 
 
 from constants import METER, SECOND
-from control import ConstantController, VirtualController
+from control import ConstantController, VirtualController, controls_changed
 from mobile import MobileObject
 from sensors import RangingOracle, VirtualSensor
 
@@ -16,11 +16,11 @@ class CatConfig:
 
     # physics
     max_speed: Optional[float] = 1.0 * (METER / SECOND) 
-    initial_position: Optional[np.ndarray]=np.zeros(2) * METER
-    initial_velocity: Optional[np.ndarray]=np.zeros(2) * (METER / SECOND)
+    initial_position: Optional[np.ndarray]=dataclasses.field(default_factory=lambda: np.zeros(2, dtype=np.float32) * METER)
+    initial_velocity: Optional[np.ndarray]=dataclasses.field(default_factory=lambda: np.zeros(2, dtype=np.float32) * (METER / SECOND))
 
     # control 
-    controller: Optional[VirtualController]=ConstantController()
+    controller: Optional[VirtualController]=dataclasses.field(default_factory=ConstantController)
 
     # sensing 
     sensor: Optional[VirtualSensor]=None
@@ -32,30 +32,25 @@ class Cat(MobileObject):
 
         # physics 
         self._max_speed: float = self.config.max_speed
-        self._position: np.ndarray = self.config.initial_position
-        self._velocity: np.ndarray = self.config.initial_velocity
+        self._position: np.ndarray = np.array(self.config.initial_position, dtype=np.float32)
+        self._velocity: np.ndarray = np.array(self.config.initial_velocity, dtype=np.float32)
         
         # control 
         self.controller: VirtualController = self.config.controller
 
         # sensing 
+        self._target: MobileObject = None
         if self.config.sensor == None: 
             self.sensor = RangingOracle(self)
 
     def __repr__(self) -> str: 
-        try: 
-            target_name: str = self.target.name 
-        except AttributeError: 
-            target_name: str = None 
+        target_name: str = getattr(self.target, "name", None)
 
         return f"{self.__class__.__name__}(name={self.name}, position={self.position}, velocity={self.velocity}, max_speed={self._max_speed}, target={target_name})"
 
     @property 
     def target(self) -> MobileObject: 
-        try: 
-            return self._target 
-        except AttributeError: 
-            return None
+        return self._target 
     
     @target.setter 
     def target(self, new_target: MobileObject) -> None: 
@@ -75,13 +70,41 @@ class Cat(MobileObject):
     def max_speed(self) -> float: 
         return self._max_speed
 
+    @max_speed.setter 
+    def max_speed(self, new_max_speed: float) -> None: 
+        self._max_speed = new_max_speed
+        controls_changed()
+
+    @property 
+    def controller(self) -> VirtualController: 
+        return self._controller
+
+    @controller.setter 
+    def controller(self, new_controller: VirtualController) -> None: 
+        self._controller = new_controller
+        controls_changed()
+
+    @property 
+    def sensor(self) -> VirtualSensor: 
+        return self._sensor
+
+    @sensor.setter 
+    def sensor(self, new_sensor: VirtualSensor) -> None: 
+        self._sensor = new_sensor
+        controls_changed()
+
     @position.setter
     def position(self, new_position: np.ndarray) -> None: 
-        self._position: np.ndarray = new_position 
+        self._position[:] = new_position 
     
     @velocity.setter 
     def velocity(self, new_velocity: np.ndarray) -> None: 
-        self._velocity: np.ndarray = new_velocity 
+        self._velocity[:] = new_velocity 
+
+    def bind(self, position: np.ndarray, velocity: np.ndarray) -> None: 
+        # position/velocity become views into state owned by the simulator 
+        self._position: np.ndarray = position 
+        self._velocity: np.ndarray = velocity 
 
     def draw(self, ax) -> None: 
         ax.scatter(self.position[0], self.position[1], c="k")
\ No newline at end of file
@@ -1,18 +1,44 @@
 from abc import ABC, abstractmethod
+import collections
 import dataclasses
-from typing import Any, Collection, List, Optional, Sequence
+import itertools
+from typing import Any, Collection, Iterator, List, Optional, Sequence
 
 import numpy as np
 import numpy.random as npr
 
 from sensors import SensorState
 
+# simulators cache which agents are driven by ranging oracle controllers, along with their modes and max speeds; anything that 
+# changes those bumps the version so the simulator knows to refresh its cache (values come from `itertools.count` so concurrent bumps stay unique)
+_versions: Iterator[int] = itertools.count(1)
+_controls_version: int = 0
+
+def controls_changed() -> None: 
+    global _controls_version
+    _controls_version = next(_versions)
+
+def controls_version() -> int: 
+    return _controls_version
+
 @dataclasses.dataclass 
 class ControlSignal: 
     payload: np.ndarray 
     metadata: Optional[dict]=None
 
 class VirtualController(ABC): 
+    _track_history: bool = False 
+
+    # when set, controls are wrapped in a `ControlSignal` and appended to the history as they're produced 
+    @property 
+    def track_history(self) -> bool: 
+        return self._track_history
+
+    @track_history.setter 
+    def track_history(self, track_history: bool) -> None: 
+        self._track_history = track_history
+        controls_changed()
+
     @property 
     @abstractmethod 
     def history(self) -> Sequence[np.ndarray]: 
@@ -27,16 +53,22 @@ class VirtualController(ABC):
     def internal_state(self) -> Optional[Any]: 
         raise NotImplementedError
 
+    # controllers write into `out` when it's provided (and return it), otherwise they allocate the control 
     @abstractmethod
-    def __call__(self, state: Collection[SensorState]) -> ControlSignal: 
+    def __call__(self, state: Collection[SensorState], out: Optional[np.ndarray]=None) -> np.ndarray: 
         raise NotImplementedError
 
+    def record(self, state: Optional[Collection[SensorState]], control: np.ndarray) -> None: 
+        self._history.append(ControlSignal(control.copy(), self._metadata))
+
 class ConstantController(VirtualController): 
     name: str = "ContantController"
 
-    def __init__(self, constant: Optional[np.ndarray]=np.zeros(2)): 
-        self.constant = constant
-        self._history: List[ControlSignal] = [ControlSignal(constant)]
+    def __init__(self, constant: Optional[np.ndarray]=None, track_history: Optional[bool]=False): 
+        self.constant: np.ndarray = np.zeros(2) if constant is None else np.asarray(constant)
+        self._metadata: dict = dict(name=self.name)
+        self._history: List[ControlSignal] = [ControlSignal(self.constant, self._metadata)]
+        self.track_history: bool = track_history
 
     @property 
     def history(self) -> Sequence[ControlSignal]: 
@@ -49,43 +81,58 @@ class ConstantController(VirtualController):
     def internal_state(self) -> np.ndarray: 
         return self.constant
 
-    def __call__(self, state: Collection[SensorState]) -> ControlSignal: 
-        return ControlSignal(self.constant, dict(name=self.name))
+    def __call__(self, state: Collection[SensorState], out: Optional[np.ndarray]=None) -> np.ndarray: 
+        if self.track_history: 
+            self.record(state, self.constant)
+
+        if out is None: 
+            return self.constant
+
+        out[:] = self.constant
+        return out
 
 class RandomController(VirtualController): 
     name: str = "RandomController"
 
-    def __init__(self, gain: Optional[float]=1.0, buffer_size: Optional[int]=10):
+    def __init__(self, gain: Optional[float]=1.0, buffer_size: Optional[int]=10, track_history: Optional[bool]=False, rng: Optional[npr.Generator]=None):
         self.gain: float = gain
+        # each controller draws from its own generator (fresh OS entropy unless one is given), so forked or threaded rollouts don't share a noise stream 
+        self.rng: npr.Generator = npr.default_rng() if rng is None else rng
         self._buffer_size = buffer_size
-        self._history: Sequence[ControlSignal] = [] 
+        self._history: Sequence[ControlSignal] = collections.deque(maxlen=buffer_size)
+        self._metadata: dict = dict(name=self.name)
+        self.track_history: bool = track_history
 
     def reset(self) -> None: 
         pass 
 
     @property 
     def history(self) -> Sequence[ControlSignal]: 
-        return self._history
+        return list(self._history)
 
     @property 
     def internal_state(self) -> float: 
         return self.gain
 
-    def __call__(self, state: Collection[SensorState]) -> np.ndarray: 
-        control = ControlSignal(npr.uniform(-1.0, 1.0, size=2) * self.gain, dict(name=self.name))
-        if len(self._history) >= self._buffer_size: 
-            self._history.pop()
+    def __call__(self, state: Collection[SensorState], out: Optional[np.ndarray]=None) -> np.ndarray: 
+        control: np.ndarray = np.multiply(self.rng.uniform(-1.0, 1.0, size=2), self.gain, out=out)
+
+        if self.track_history: 
+            self.record(state, control)
 
-        self._history.append(control)
         return control 
 
 class RangingOracleController(VirtualController): 
     name: str = "RangingOracleController"
 
-    def __init__(self, mode: Optional[str]="target", buffer_size: Optional[int]=1_000): 
-        self._mode = mode
+    # the simulator evaluates this policy for all oracle-controlled agents at once (see `Simulator._apply_controls`)
+    vectorized: bool = True
+
+    def __init__(self, mode: Optional[str]="target", buffer_size: Optional[int]=1_000, track_history: Optional[bool]=False): 
+        self.mode = mode
         self._buffer_size = buffer_size
-        self._history: Sequence[ControlSignal] = [] 
+        self._history: Sequence[ControlSignal] = collections.deque(maxlen=buffer_size)
+        self.track_history: bool = track_history
 
     def reset(self) -> None: 
         pass 
@@ -96,8 +143,12 @@ class RangingOracleController(VirtualController):
     
     @mode.setter 
     def mode(self, new_mode: str) -> None: 
-        assert new_mode in ["target", "avoid"]
+        if new_mode not in ["target", "avoid"]: 
+            raise ValueError(f"unknown mode: {new_mode}")
+
         self._mode = new_mode
+        self._metadata: dict = dict(name=self.name, mode=self.mode)
+        controls_changed()
 
     @property 
     def internal_state(self) -> str: 
@@ -105,29 +156,31 @@ class RangingOracleController(VirtualController):
 
     @property 
     def history(self) -> Sequence[ControlSignal]: 
-        return self._history
+        return list(self._history)
     
-    def __call__(self, state: Collection[SensorState]) -> np.ndarray: 
+    def __call__(self, state: Collection[SensorState], out: Optional[np.ndarray]=None) -> np.ndarray: 
 
         if not isinstance(state, Collection): 
             state: Collection[SensorState] = [state]
 
-        control: np.ndarray = np.zeros(2)
+        control: np.ndarray = np.zeros(2) if out is None else out
+        control[:] = 0.
+        control_norm: float = 0.
 
         for observation in state: 
-            if (np.linalg.norm(observation.payload) > np.linalg.norm(control)): 
+            observation_norm: float = np.linalg.norm(observation.payload)
+
+            if (observation_norm > control_norm): 
+                control_norm = observation_norm
+
                 if self.mode == "target": 
-                    control = observation.payload 
+                    np.copyto(control, observation.payload)
                 elif self.mode == "avoid": 
-                    control = -observation.payload 
+                    np.negative(observation.payload, out=control)
                 else: 
                     raise NotImplementedError
 
-        control = ControlSignal(control, dict(name=self.name, mode=self.mode))
-
-        if len(self._history) >= self._buffer_size: 
-            self._history.pop()
-
-        self._history.append(control.payload)
+        if self.track_history: 
+            self.record(state, control)
 
         return control 
\ No newline at end of file
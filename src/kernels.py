@@ -0,0 +1,140 @@
+import functools
+
+import numpy as np
+
+try: 
+    import numba
+    jit: callable = functools.partial(numba.njit, parallel=False, fastmath=True, cache=True, nogil=True)
+except ImportError: 
+    # without numba the loop kernels below are replaced by their numpy equivalents (see the end of the module) 
+    numba = None
+    jit: callable = lambda kernel: kernel
+
+@jit
+def _clip(vx: float, vy: float, max_speed: float) -> tuple:
+    speed: float = np.sqrt(vx * vx + vy * vy)
+    if speed > max_speed:
+        scale: float = max_speed / speed
+        return vx * scale, vy * scale
+    return vx, vy
+
+@jit
+def _integrate(pos: np.ndarray, vel: np.ndarray, dt: float) -> None:
+    for i in range(pos.shape[0]):
+        pos[i, 0] += vel[i, 0] * dt
+        pos[i, 1] += vel[i, 1] * dt
+
+@jit
+def _oracle_control(pos: np.ndarray, vel: np.ndarray, target_pos: np.ndarray, targets: np.ndarray, sign: np.ndarray, max_speed: np.ndarray, fused: np.ndarray) -> None:
+    """Writes the (clipped) ranging oracle control towards (sign > 0) or away from (sign < 0)
+    each agent's target for the agents flagged in `fused`.
+    """
+    for i in range(pos.shape[0]):
+        if fused[i]:
+            target: int = targets[i]
+            vel[i, 0], vel[i, 1] = _clip(sign[i, 0] * (target_pos[target, 0] - pos[i, 0]), sign[i, 0] * (target_pos[target, 1] - pos[i, 1]), max_speed[i, 0])
+
+@jit
+def _step_kernel(cat_pos: np.ndarray, cat_vel: np.ndarray, laser_pos: np.ndarray, laser_vel: np.ndarray,
+        cat_max_speed: np.ndarray, laser_max_speed: np.ndarray, cat_sign: np.ndarray, laser_sign: np.ndarray,
+        cat_fused: np.ndarray, laser_fused: np.ndarray, dt: float, dist2: np.ndarray, cat_targets: np.ndarray, laser_targets: np.ndarray) -> None:
+    """Advances the (cat, laser) state by one timestep in place: Euler integration,
+    nearest-target selection, and the (clipped) ranging oracle control for the agents
+    flagged in `cat_fused`/`laser_fused`. All buffers are preallocated by the caller.
+    """
+    num_cats: int = cat_pos.shape[0]
+    num_lasers: int = laser_pos.shape[0]
+
+    _integrate(cat_pos, cat_vel, dt)
+    _integrate(laser_pos, laser_vel, dt)
+
+    if num_cats == 0 or num_lasers == 0:
+        return
+
+    # (cat, laser) squared distance matrix
+    for i in range(num_cats):
+        for j in range(num_lasers):
+            dx: float = cat_pos[i, 0] - laser_pos[j, 0]
+            dy: float = cat_pos[i, 1] - laser_pos[j, 1]
+            dist2[i, j] = dx * dx + dy * dy
+
+    # cats target the nearest laser
+    for i in range(num_cats):
+        nearest: int = 0
+        for j in range(1, num_lasers):
+            if dist2[i, j] < dist2[i, nearest]:
+                nearest = j
+        cat_targets[i] = nearest
+
+    # lasers avoid the nearest cat
+    for j in range(num_lasers):
+        nearest: int = 0
+        for i in range(1, num_cats):
+            if dist2[i, j] < dist2[nearest, j]:
+                nearest = i
+        laser_targets[j] = nearest
+
+    _oracle_control(cat_pos, cat_vel, laser_pos, cat_targets, cat_sign, cat_max_speed, cat_fused)
+    _oracle_control(laser_pos, laser_vel, cat_pos, laser_targets, laser_sign, laser_max_speed, laser_fused)
+
+@jit
+def _first_outside(pos: np.ndarray, origins: np.ndarray, halves: np.ndarray) -> int:
+    """Returns the index of the first position lying outside every (origin, half extent)
+    box, or -1 if all positions are inside at least one box.
+    """
+    for i in range(pos.shape[0]):
+        inside: bool = False
+        for k in range(origins.shape[0]):
+            if abs(pos[i, 0] - origins[k, 0]) < halves[k, 0] and abs(pos[i, 1] - origins[k, 1]) < halves[k, 1]:
+                inside = True
+                break
+        if not inside:
+            return i
+    return -1
+
+def _integrate_numpy(pos: np.ndarray, vel: np.ndarray, dt: float) -> None: 
+    pos += vel * dt
+
+def _oracle_control_numpy(pos: np.ndarray, vel: np.ndarray, target_pos: np.ndarray, targets: np.ndarray, sign: np.ndarray, max_speed: np.ndarray, fused: np.ndarray) -> None: 
+    control: np.ndarray = sign * (target_pos[targets] - pos)
+    speed: np.ndarray = np.sqrt(np.sum(control * control, axis=1, keepdims=True))
+    control *= np.divide(max_speed, speed, out=np.ones_like(speed), where=speed > max_speed)
+    vel[fused] = control[fused]
+
+def _step_kernel_numpy(cat_pos: np.ndarray, cat_vel: np.ndarray, laser_pos: np.ndarray, laser_vel: np.ndarray,
+        cat_max_speed: np.ndarray, laser_max_speed: np.ndarray, cat_sign: np.ndarray, laser_sign: np.ndarray,
+        cat_fused: np.ndarray, laser_fused: np.ndarray, dt: float, dist2: np.ndarray, cat_targets: np.ndarray, laser_targets: np.ndarray) -> None: 
+    _integrate_numpy(cat_pos, cat_vel, dt)
+    _integrate_numpy(laser_pos, laser_vel, dt)
+
+    if cat_pos.shape[0] == 0 or laser_pos.shape[0] == 0: 
+        return
+
+    delta: np.ndarray = cat_pos[:, None, :] - laser_pos[None, :, :]
+    np.sum(delta * delta, axis=-1, out=dist2)
+    np.argmin(dist2, axis=1, out=cat_targets)
+    np.argmin(dist2, axis=0, out=laser_targets)
+
+    _oracle_control_numpy(cat_pos, cat_vel, laser_pos, cat_targets, cat_sign, cat_max_speed, cat_fused)
+    _oracle_control_numpy(laser_pos, laser_vel, cat_pos, laser_targets, laser_sign, laser_max_speed, laser_fused)
+
+def _first_outside_numpy(pos: np.ndarray, origins: np.ndarray, halves: np.ndarray) -> int: 
+    inside: np.ndarray = np.any(np.all(np.abs(pos[:, None, :] - origins) < halves, axis=-1), axis=1)
+    return -1 if inside.all() else int(np.argmin(inside))
+
+if numba is None: 
+    # interpreting the loop kernels is an order of magnitude slower than these broadcast equivalents 
+    _integrate, _oracle_control, _step_kernel, _first_outside = _integrate_numpy, _oracle_control_numpy, _step_kernel_numpy, _first_outside_numpy
+
+def warmup() -> None:
+    """Triggers JIT compilation (or a cache load) of the kernels on dummy state so
+    the first simulator step doesn't pay for it.
+    """
+    pos: np.ndarray = np.zeros((1, 2), dtype=np.float32)
+    column: np.ndarray = np.ones((1, 1), dtype=np.float32)
+    fused: np.ndarray = np.ones(1, dtype=bool)
+    targets: np.ndarray = np.zeros(1, dtype=np.int64)
+    _step_kernel(pos.copy(), pos.copy(), pos.copy(), pos.copy(), column, column, column, column, fused, fused, 0., np.zeros((1, 1), dtype=np.float32), targets, targets.copy())
+    _integrate(pos.copy(), pos.copy(), 0.)
+    _oracle_control(pos.copy(), pos.copy(), pos.copy(), targets, column, column, fused)
+    _first_outside(pos, np.zeros((1, 2)), np.ones((1, 2)))
@@ -5,7 +5,7 @@ import matplotlib.pyplot as plt
 import numpy as np 
 
 from constants import METER, SECOND
-from control import VirtualController, ConstantController
+from control import VirtualController, ConstantController, controls_changed
 from mobile import MobileObject
 from sensors import RangingOracle, VirtualSensor
 
@@ -15,11 +15,11 @@ class LaserConfig:
 
     # physics
     max_speed: Optional[float] = 1.0 * (METER / SECOND) 
-    initial_position: Optional[np.ndarray]=np.zeros(2) * METER
-    initial_velocity: Optional[np.ndarray]=np.zeros(2) * (METER / SECOND)
+    initial_position: Optional[np.ndarray]=dataclasses.field(default_factory=lambda: np.zeros(2, dtype=np.float32) * METER)
+    initial_velocity: Optional[np.ndarray]=dataclasses.field(default_factory=lambda: np.zeros(2, dtype=np.float32) * (METER / SECOND))
 
     # control 
-    controller: Optional[VirtualController]=ConstantController()
+    controller: Optional[VirtualController]=dataclasses.field(default_factory=ConstantController)
 
     # sensing 
     sensor: Optional[VirtualSensor]=None
@@ -27,21 +27,20 @@ class LaserConfig:
 class Laser(MobileObject): 
     def __init__(self, config: LaserConfig): 
         self.config = config
+        self._target: MobileObject = None
+        self._controller: VirtualController = None
         self.reset()
 
     def __repr__(self) -> str: 
-        try: 
-            target_name: str = self.target.name 
-        except AttributeError: 
-            target_name: str = None 
+        target_name: str = getattr(self.target, "name", None)
 
         return f"{self.__class__.__name__}(name={self.config.name}, position={self.position}, velocity={self.velocity}, max_speed={self._max_speed}, target={target_name})"
 
     def reset(self) -> None: 
         self.name: str = self.config.name 
-        self._position: np.ndarray = self.config.initial_position
-        self._velocity: np.ndarray = self.config.initial_velocity
-        self._max_speed: float = self.config.max_speed
+        self._position: np.ndarray = np.array(self.config.initial_position, dtype=np.float32)
+        self._velocity: np.ndarray = np.array(self.config.initial_velocity, dtype=np.float32)
+        self.max_speed = self.config.max_speed
 
 
         if self.config.sensor == None: 
@@ -49,17 +48,14 @@ class Laser(MobileObject):
         else: 
             self.sensor.reset()
 
-        try: 
+        if self.controller is not None: 
             self.controller.reset()
-        except AttributeError: 
+        else: 
             self.controller = self.config.controller
 
     @property 
     def target(self) -> MobileObject: 
-        try: 
-            return self._target
-        except AttributeError: 
-            return None
+        return self._target
 
     @property 
     def position(self) -> np.ndarray: 
@@ -73,13 +69,41 @@ class Laser(MobileObject):
     def max_speed(self) -> float: 
         return self._max_speed
 
+    @max_speed.setter 
+    def max_speed(self, new_max_speed: float) -> None: 
+        self._max_speed = new_max_speed
+        controls_changed()
+
+    @property 
+    def controller(self) -> VirtualController: 
+        return self._controller
+
+    @controller.setter 
+    def controller(self, new_controller: VirtualController) -> None: 
+        self._controller = new_controller
+        controls_changed()
+
+    @property 
+    def sensor(self) -> VirtualSensor: 
+        return self._sensor
+
+    @sensor.setter 
+    def sensor(self, new_sensor: VirtualSensor) -> None: 
+        self._sensor = new_sensor
+        controls_changed()
+
     @position.setter 
     def position(self, new_position: np.ndarray) -> None: 
-        self._position = new_position 
+        self._position[:] = new_position 
 
     @velocity.setter 
     def velocity(self, new_velocity: np.ndarray) -> None: 
-        self._velocity = new_velocity 
+        self._velocity[:] = new_velocity 
+
+    def bind(self, position: np.ndarray, velocity: np.ndarray) -> None: 
+        # position/velocity become views into state owned by the simulator 
+        self._position = position 
+        self._velocity = velocity 
 
     @target.setter
     def target(self, new_target: MobileObject) -> None: 
@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 import dataclasses
-from typing import Optional
+import types
+from typing import Mapping, Optional
 
 import numpy as np 
 
@@ -9,7 +10,7 @@ from mobile import MobileObject
 @dataclasses.dataclass
 class SensorState(ABC): 
     payload: np.ndarray 
-    metadata: Optional[dict]
+    metadata: Optional[Mapping]
 
 class VirtualSensor(ABC): 
     @abstractmethod 
@@ -26,6 +27,8 @@ class VirtualSensor(ABC):
 
 class RangingOracle(VirtualSensor): 
     name: str = "RangingOracle"
+    # shared by every reading, so it's read-only 
+    _META: Mapping = types.MappingProxyType(dict(name=name))
 
     def __init__(self, subject: Optional[MobileObject], target: Optional[MobileObject]=None): 
         self._subject: MobileObject = subject 
@@ -43,17 +46,18 @@ class RangingOracle(VirtualSensor):
 
     @property 
     def target(self) -> MobileObject: 
-        try: 
-            return self._target
-        except AttributeError: 
-            return None
+        return self._target
 
     @target.setter
     def target(self, new_target: MobileObject) -> None: 
         self._target = new_target
 
     def read(self) -> SensorState: 
-        return SensorState(self._target.position - self._subject.position, dict(name=self.name))
+        return SensorState(self._target.position - self._subject.position, RangingOracle._META)
+
+    def read_into(self, out: np.ndarray) -> np.ndarray: 
+        # the bare relative position, written into a preallocated buffer 
+        return np.subtract(self._target.position, self._subject.position, out=out)
 
     def write(self, state: SensorState) -> None: 
         pass 
\ No newline at end of file
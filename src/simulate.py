@@ -1,6 +1,9 @@
-import copy 
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import inspect
+import multiprocessing
 import os 
-from typing import Collection, Dict, Optional, Sequence, Union
+from typing import Callable, Collection, List, Optional, Tuple, Union
 
 import matplotlib 
 from matplotlib import animation, gridspec 
@@ -8,15 +11,40 @@ import matplotlib.pyplot as plt
 matplotlib.use("Agg")
 import numpy as np 
 
+try: 
+    from scipy.spatial import cKDTree
+except ImportError: 
+    # without scipy every simulation uses the dense distance kernel
+    cKDTree = None
+
 from cat import Cat
 from constants import MILLISECOND
-from control import ControlSignal
+from control import RangingOracleController, VirtualController, controls_version
+from kernels import _first_outside, _integrate, _oracle_control, _step_kernel, warmup
 from laser import Laser 
-from sensors import SensorState
+from sensors import RangingOracle, SensorState
 from world import House
 
+def _fused_oracle(agent: Union[Cat, Laser]) -> bool: 
+    return isinstance(agent.controller, RangingOracleController) and agent.controller.vectorized and isinstance(agent.sensor, RangingOracle)
+
+def _takes_out(controller: VirtualController) -> bool: 
+    # controllers written against the older `__call__(self, state)` signature don't accept an `out` buffer 
+    try: 
+        parameters = inspect.signature(controller).parameters.values()
+    except (TypeError, ValueError): 
+        return False
+    return any((parameter.name == "out") or (parameter.kind == inspect.Parameter.VAR_KEYWORD) for parameter in parameters)
+
+def _run_rollout(make_simulator: Callable[[int], "Simulator"], num_steps: int, seed: int) -> Tuple[np.ndarray, np.ndarray]: 
+    simulator: Simulator = make_simulator(seed)
+    simulator.simulate(num_steps)
+    return simulator._cat_pos.copy(), simulator._laser_pos.copy()
+
 class Simulator: 
     timestep_duration: float = 10.0 * MILLISECOND
+    render_log_capacity: int = 128
+    kdtree_min_agents: int = 32
 
     def __init__(self, house: House, cats: Collection[Cat], lasers: Collection[Laser], artifact_path: Optional[os.PathLike]=None) -> None: 
         self.current_step: int = 0 
@@ -24,6 +52,11 @@ class Simulator:
         self.artifact_path = artifact_path
         self.cats = cats
         self.lasers = lasers 
+        self._dt: float = float(self.timestep_duration)
+        self._frame_fig = None
+        self._pack_state()
+        self._reset_render_logs()
+        warmup()
 
     def __repr__(self) -> str: 
         return f"{self.__class__.__name__}(house={self.house}, cats={self.cats}, lasers={self.lasers})"
@@ -41,99 +74,223 @@ class Simulator:
         for laser in self.lasers: 
             laser.reset()
 
+        self._pack_state()
+        self._reset_render_logs()
+
+    def _pack_state(self) -> None: 
+        # agent state is stored as (num_agents, 2) float32 arrays owned by the simulator; each agent holds row views into them 
+        self._cat_pos: np.ndarray = np.array([cat.position for cat in self.cats], dtype=np.float32).reshape(-1, 2)
+        self._cat_vel: np.ndarray = np.array([cat.velocity for cat in self.cats], dtype=np.float32).reshape(-1, 2)
+        self._laser_pos: np.ndarray = np.array([laser.position for laser in self.lasers], dtype=np.float32).reshape(-1, 2)
+        self._laser_vel: np.ndarray = np.array([laser.velocity for laser in self.lasers], dtype=np.float32).reshape(-1, 2)
+
+        for i, cat in enumerate(self.cats): 
+            cat.bind(self._cat_pos[i], self._cat_vel[i])
+
+        for j, laser in enumerate(self.lasers): 
+            laser.bind(self._laser_pos[j], self._laser_vel[j])
+
+        self._cat_max_speed: np.ndarray = np.empty((len(self.cats), 1), dtype=np.float32)
+        self._laser_max_speed: np.ndarray = np.empty((len(self.lasers), 1), dtype=np.float32)
+        self._cat_sign: np.ndarray = np.empty((len(self.cats), 1), dtype=np.float32)
+        self._laser_sign: np.ndarray = np.empty((len(self.lasers), 1), dtype=np.float32)
+        self._cat_fused: np.ndarray = np.zeros(len(self.cats), dtype=bool)
+        self._laser_fused: np.ndarray = np.zeros(len(self.lasers), dtype=bool)
+        self.refresh_controls()
+
+        # scratch buffers for `_step_kernel`; the dense (num_cats, num_lasers) distance matrix is allocated on the first dense step, so it's never held on the KD-tree path 
+        self._dist2: np.ndarray = np.empty((0, 0), dtype=np.float32)
+        self._cat_targets: np.ndarray = np.zeros(len(self.cats), dtype=np.int64)
+        self._laser_targets: np.ndarray = np.zeros(len(self.lasers), dtype=np.int64)
+
+        # targets assigned to the agents on the previous step (-1: not yet assigned) 
+        self._prev_cat_targets: np.ndarray = np.full(len(self.cats), -1, dtype=np.int64)
+        self._prev_laser_targets: np.ndarray = np.full(len(self.lasers), -1, dtype=np.int64)
+
+    def refresh_controls(self) -> None: 
+        # agents driven by a ranging oracle controller are updated together by the kernels; the sign encodes the controller mode 
+        # `step` calls this whenever a controller mode, an agent's controller or sensor, or a max speed has changed (see `control.controls_changed`) 
+        self._controls_version: int = controls_version()
+        # (index, whether the controller takes an `out` buffer) for the agents that aren't fused 
+        self._cat_unfused: List[Tuple[int, bool]] = []
+        self._laser_unfused: List[Tuple[int, bool]] = []
+        # fused agents whose controllers record their history 
+        self._cat_tracked_idx: List[int] = []
+        self._laser_tracked_idx: List[int] = []
+
+        for agents, fused, sign, max_speed, unfused, tracked_idx in ((self.cats, self._cat_fused, self._cat_sign, self._cat_max_speed, self._cat_unfused, self._cat_tracked_idx), 
+                (self.lasers, self._laser_fused, self._laser_sign, self._laser_max_speed, self._laser_unfused, self._laser_tracked_idx)): 
+            for i, agent in enumerate(agents): 
+                fused[i] = _fused_oracle(agent)
+                sign[i, 0] = -1. if (fused[i] and agent.controller.mode == "avoid") else 1.
+                max_speed[i, 0] = agent.max_speed
+
+                if not fused[i]: 
+                    unfused.append((i, _takes_out(agent.controller)))
+                elif agent.controller.track_history: 
+                    tracked_idx.append(i)
+
     def simulate(self, num_steps: int, **kwargs) -> None: 
+        if kwargs.get("save_render_artifacts", False) and (self._num_render_artifacts + num_steps > len(self._cat_pos_log)): 
+            self._allocate_render_logs(self._num_render_artifacts + num_steps)
+
         for _ in range(num_steps): 
             self.step(**kwargs)
 
+    @staticmethod 
+    def run_batch(make_simulator: Callable[[int], "Simulator"], num_envs: int, num_steps: int, num_workers: Optional[int]=None, backend: Optional[str]="process") -> List[Tuple[np.ndarray, np.ndarray]]: 
+        # independent rollouts: `make_simulator(seed)` is called with seeds 0, ..., num_envs - 1 and must be picklable for the process backend 
+        # randomness should be drawn from generators seeded inside `make_simulator` (e.g. `RandomController(rng=npr.default_rng(seed))`), not the global numpy stream 
+        rollout: Callable[[int], Tuple[np.ndarray, np.ndarray]] = functools.partial(_run_rollout, make_simulator, num_steps)
+        seeds: range = range(num_envs)
+
+        if backend == "process": 
+            with multiprocessing.Pool(processes=num_workers) as pool: 
+                return pool.map(rollout, seeds)
+        elif backend == "thread": 
+            with ThreadPoolExecutor(max_workers=num_workers) as executor: 
+                return list(executor.map(rollout, seeds))
+        else: 
+            raise ValueError(f"unknown backend: {backend}")
+
     def step(self, **kwargs) -> None:
         if kwargs.get("save_render_artifacts", False): 
             self.save_render_artifacts()
 
-        # move the cats based on their current velocity TODO: cat position should just be clipped to walls
-        for i, cat in enumerate(self.cats):
-            try: 
-                cat.position += cat.velocity * self.timestep_duration
-                if (not self.house.inside(cat.position)): 
-                    raise ValueError
-            except ValueError: 
-                raise ValueError(f"Collision detected: tried to move cat to position: {cat.position}")
-
-        # move the lasers based on their current velocity TODO: laser position should just be clipped to walls
-        for i, laser in enumerate(self.lasers): 
-            try: 
-                laser.position += laser.velocity * self.timestep_duration
-                if (not self.house.inside(laser.position)): 
-                    raise ValueError
-            except ValueError: 
-                raise ValueError(f"Collision detected: tried to move laser to position: {laser.position}")
-
-        # (cat, laser) distance matrix
-        distances: np.ndarray = np.zeros((len(self.cats), len(self.lasers)))
-
-        for i, cat in enumerate(self.cats): 
-            for j, laser in enumerate(self.lasers): 
-                distances[i, j] = np.linalg.norm(cat.position - laser.position)
+        if controls_version() != self._controls_version: 
+            self.refresh_controls()
+
+        # move the cats and lasers based on their current velocity, select targets, and update the oracle controls TODO: positions should just be clipped to walls
+        if (cKDTree is None) or (min(len(self.cats), len(self.lasers)) < self.kdtree_min_agents): 
+            if self._dist2.shape != (len(self.cats), len(self.lasers)): 
+                self._dist2 = np.empty((len(self.cats), len(self.lasers)), dtype=np.float32)
+
+            _step_kernel(self._cat_pos, self._cat_vel, self._laser_pos, self._laser_vel, self._cat_max_speed, self._laser_max_speed, 
+                    self._cat_sign, self._laser_sign, self._cat_fused, self._laser_fused, self._dt, self._dist2, self._cat_targets, self._laser_targets)
+        else: 
+            # large populations: nearest-neighbor queries against a spatial index instead of the dense distance matrix 
+            _integrate(self._cat_pos, self._cat_vel, self._dt)
+            _integrate(self._laser_pos, self._laser_vel, self._dt)
+            _, self._cat_targets[:] = cKDTree(self._laser_pos).query(self._cat_pos, k=1)
+            _, self._laser_targets[:] = cKDTree(self._cat_pos).query(self._laser_pos, k=1)
+            _oracle_control(self._cat_pos, self._cat_vel, self._laser_pos, self._cat_targets, self._cat_sign, self._cat_max_speed, self._cat_fused)
+            _oracle_control(self._laser_pos, self._laser_vel, self._cat_pos, self._laser_targets, self._laser_sign, self._laser_max_speed, self._laser_fused)
+
+        for kind, positions in (("cat", self._cat_pos), ("laser", self._laser_pos)): 
+            outside: int = self._first_collision(positions)
+            if outside >= 0: 
+                raise ValueError(f"Collision detected: tried to move {kind} to position: {positions[outside]}")
+
+        # cats target the nearest laser, lasers avoid the nearest cat; only changed targets are reassigned 
+        for i in np.flatnonzero(self._cat_targets != self._prev_cat_targets): 
+            self.cats[i].target = self.lasers[self._cat_targets[i]]
+
+        for j in np.flatnonzero(self._laser_targets != self._prev_laser_targets): 
+            self.lasers[j].target = self.cats[self._laser_targets[j]]
+
+        self._prev_cat_targets[:] = self._cat_targets
+        self._prev_laser_targets[:] = self._laser_targets
+            
+        self._apply_controls()
 
-        # cats target the nearest laser 
-        for i, cat in enumerate(self.cats): 
-            nearest_laser: Laser = self.lasers[np.argmin(distances[i, :])]
-            cat.target = nearest_laser
+        self.current_step += 1
 
-        # lasers avoid the nearest cat 
-        for j, laser in enumerate(self.lasers): 
-            nearest_cat: Cat = self.cats[np.argmin(distances[:, j])]
-            laser.target = nearest_cat 
-            
-        # cats make an observation and derive a control signal from it (TODO pedantic and too much indirection... cats can handle this internally)
-        for i, cat in enumerate(self.cats): 
+        # stream the updated state straight to the writer instead of buffering render artifacts 
+        stream_writer: Optional[animation.AbstractMovieWriter] = kwargs.get("stream_writer", None)
+        if stream_writer is not None: 
+            self._draw_frame()
+            stream_writer.grab_frame()
+
+    def _first_collision(self, positions: np.ndarray) -> int: 
+        """Index of the first position outside the house, or -1 if every position is inside."""
+        boxes: Optional[Tuple[np.ndarray, np.ndarray]] = self.house.boxes
+        if boxes is not None: 
+            return _first_outside(positions, *boxes)
+
+        inside: np.ndarray = self.house.inside_batch(positions)
+        return -1 if inside.all() else int(np.argmin(inside))
+
+    def _apply_controls(self) -> None: 
+        # ranging oracle controls are applied by `_step_kernel`; all other agents make an observation and derive a control signal from it 
+        # controls that weren't written into the velocity buffer (or returned as it) are copied into it 
+        for i, takes_out in self._cat_unfused: 
+            cat: Cat = self.cats[i]
             observation: SensorState = cat.sensor.read()
-            control_signal: ControlSignal = cat.controller(observation)
-            cat.velocity = control_signal.payload 
+            velocity: np.ndarray = self._cat_vel[i]
+            control: np.ndarray = cat.controller(observation, out=velocity) if takes_out else cat.controller(observation)
+            if control is not velocity: 
+                velocity[:] = control
 
-        # lasers make an observation and derive a control signal from it (TODO pedantic and too much indirection... lasers can handle this internally)
-        for j, laser in enumerate(self.lasers): 
+        for j, takes_out in self._laser_unfused: 
+            laser: Laser = self.lasers[j]
             observation: SensorState = laser.sensor.read()
-            control_signal: ControlSignal = laser.controller(observation)
-            laser.velocity = control_signal.payload
-    
-        self.current_step += 1
+            velocity: np.ndarray = self._laser_vel[j]
+            control: np.ndarray = laser.controller(observation, out=velocity) if takes_out else laser.controller(observation)
+            if control is not velocity: 
+                velocity[:] = control
+
+        for i in self._cat_tracked_idx: 
+            self.cats[i].controller.record(None, self._cat_vel[i])
+
+        for j in self._laser_tracked_idx: 
+            self.lasers[j].controller.record(None, self._laser_vel[j])
+
+    @property 
+    def frame_figure(self) -> plt.Figure: 
+        # the figure, house and agent artists persist across frames; only the agent positions are updated 
+        if self._frame_fig is None: 
+            self._frame_fig, self._frame_ax = plt.subplots(nrows=1, ncols=1)
+            self.house.draw(self._frame_ax)
+            self._frame_cat_scatter = self._frame_ax.scatter([], [], c="k")
+            self._frame_laser_scatter = self._frame_ax.scatter([], [], c="tab:red", marker="*", s=50)
+            self._frame_ax.set_xticks([])
+            self._frame_ax.set_yticks([])
+
+        return self._frame_fig
+
+    def _draw_frame(self) -> None: 
+        figure: plt.Figure = self.frame_figure
+        self._frame_ax.set_title(f"Step {self.current_step}")
+        self._frame_cat_scatter.set_offsets(self._cat_pos)
+        self._frame_laser_scatter.set_offsets(self._laser_pos)
+        figure.canvas.draw_idle()
 
     def render_frame(self) -> None: 
         save_path: os.PathLike = os.path.join(self.artifact_path, f"step_{self.current_step}")
-
-        figure, ax = plt.subplots(nrows=1, ncols=1)
-        plt.title(f"Step {self.current_step}")
-
-        self.house.draw(ax)
-        
-        for cat in self.cats: 
-            cat.draw(ax)
-
-        for laser in self.lasers: 
-            laser.draw(ax)
-
-        plt.xticks([])
-        plt.yticks([])
-        plt.savefig(save_path)
-        plt.close()
+        self._draw_frame()
+        self._frame_fig.savefig(save_path, dpi=80)
+
+    def _allocate_render_logs(self, capacity: int) -> None: 
+        # per-step (capacity, num_agents, 2) snapshots of the agent state; recorded entries are kept when growing 
+        def grow(log: Optional[np.ndarray], num_agents: int) -> np.ndarray: 
+            new_log: np.ndarray = np.empty((capacity, num_agents, 2), dtype=np.float32)
+            if log is not None: 
+                new_log[:self._num_render_artifacts] = log[:self._num_render_artifacts]
+            return new_log
+
+        self._cat_pos_log: np.ndarray = grow(self._cat_pos_log, len(self.cats))
+        self._cat_vel_log: np.ndarray = grow(self._cat_vel_log, len(self.cats))
+        self._laser_pos_log: np.ndarray = grow(self._laser_pos_log, len(self.lasers))
+        self._laser_vel_log: np.ndarray = grow(self._laser_vel_log, len(self.lasers))
+
+    def _reset_render_logs(self) -> None: 
+        self._num_render_artifacts: int = 0 
+        self._cat_pos_log = self._cat_vel_log = self._laser_pos_log = self._laser_vel_log = None
+        self._allocate_render_logs(self.render_log_capacity)
+
+    @property 
+    def num_render_artifacts(self) -> int: 
+        return self._num_render_artifacts
 
     def save_render_artifacts(self) -> None: 
-        if not hasattr(self, "render_artifacts"): 
-            self.render_artifacts: Sequence[Dict[str, Sequence[Dict[str, np.ndarray]]]] = []
-
-        artifact: dict = dict()
-        artifact["cats"] = []
-        artifact["lasers"] = []
+        if self._num_render_artifacts == len(self._cat_pos_log): 
+            self._allocate_render_logs(2 * len(self._cat_pos_log))
 
-        for cat in self.cats: 
-            cat_artifact: dict = dict(cat=copy.deepcopy(cat), control=cat.controller.history)
-            artifact["cats"].append(cat_artifact)
-
-        for laser in self.lasers: 
-            laser_artifact: dict = dict(laser=copy.deepcopy(laser), control=laser.controller.history)
-            artifact["lasers"].append(laser_artifact)
-
-        self.render_artifacts.append(artifact)
+        self._cat_pos_log[self._num_render_artifacts] = self._cat_pos
+        self._cat_vel_log[self._num_render_artifacts] = self._cat_vel
+        self._laser_pos_log[self._num_render_artifacts] = self._laser_pos
+        self._laser_vel_log[self._num_render_artifacts] = self._laser_vel
+        self._num_render_artifacts += 1
 
     def create_animation(self) -> None: 
         save_path: os.PathLike = os.path.join(self.artifact_path, "animation.mp4")
@@ -158,70 +315,51 @@ class Simulator:
 
         plt.subplots_adjust(left=left, bottom=bottom, right=right, top=top, wspace=wspace, hspace=hspace)
 
+        num_frames: int = self._num_render_artifacts
+        cat_positions: np.ndarray = self._cat_pos_log[:num_frames]
+        laser_positions: np.ndarray = self._laser_pos_log[:num_frames]
 
-        def init():
-            self.house.draw(ax_environment)
+        # the control applied up to frame i is the velocity recorded in frames 1, ..., i
+        cat_controls: np.ndarray = self._cat_vel_log[1:num_frames]
+        laser_controls: np.ndarray = self._laser_vel_log[1:num_frames]
+
+        times: np.ndarray = np.arange(len(cat_controls)) * self.timestep_duration
 
-            ax_cats.set_xlim((0, len(self.render_artifacts) * self.timestep_duration))
+        # the house is static: it's drawn once and only the agent/control artists are updated per frame 
+        self.house.draw(ax_environment)
+        cat_scatter = ax_environment.scatter([], [], c="k")
+        laser_scatter = ax_environment.scatter([], [], c="tab:red", marker="*", s=50)
+        cat_lines: list = [ax_cats.plot([], [])[0] for _ in range(2 * cat_controls.shape[1])]
+        laser_lines: list = [ax_lasers.plot([], [])[0] for _ in range(2 * laser_controls.shape[1])]
+        artists: tuple = (cat_scatter, laser_scatter, ax_environment.title, *cat_lines, *laser_lines)
 
-            # TODO assumes just one cat! 
-            last_control: np.ndarray = np.array(self.render_artifacts[-1]["cats"][-1]["control"])
-            ax_cats.set_ylim(np.min(last_control) - 1., np.max(last_control) + 1.)
+        def init():
+            ax_cats.set_xlim((0, num_frames * self.timestep_duration))
+            ax_cats.set_ylim(np.min(cat_controls, initial=0.) - 1., np.max(cat_controls, initial=0.) + 1.)
 
-            ax_lasers.set_xlim(0, len(self.render_artifacts) * self.timestep_duration)
-            last_control: np.ndarray = np.array(self.render_artifacts[-1]["lasers"][-1]["control"])
-            ax_lasers.set_ylim(np.min(last_control) - 1., np.max(last_control) + 1.)
+            ax_lasers.set_xlim(0, num_frames * self.timestep_duration)
+            ax_lasers.set_ylim(np.min(laser_controls, initial=0.) - 1., np.max(laser_controls, initial=0.) + 1.)
 
+            ax_cats.set_title("Cat Control")
+            ax_lasers.set_title("Laser Control")
             fig.tight_layout()
             plt.subplots_adjust(left=left, bottom=bottom, right=right, top=top, wspace=wspace, hspace=hspace)
 
-            return fig,
+            return artists
 
         def animate(i):
-            ax_environment.clear()
-            ax_cats.clear()
-            ax_lasers.clear()
+            cat_scatter.set_offsets(cat_positions[i])
+            laser_scatter.set_offsets(laser_positions[i])
 
-            ax_cats.set_xlim((0, len(self.render_artifacts) * self.timestep_duration))
-            last_control: np.ndarray = np.array(self.render_artifacts[i]["cats"][-1]["control"])
-            ax_cats.set_ylim(np.min(last_control) - 1., np.max(last_control) + 1.)
+            for k, line in enumerate(cat_lines): 
+                line.set_data(times[:i], cat_controls[:i, k // 2, k % 2])
 
-            ax_lasers.set_xlim(0, len(self.render_artifacts) * self.timestep_duration)
-            last_control: np.ndarray = np.array(self.render_artifacts[i]["lasers"][-1]["control"])
-            ax_lasers.set_ylim(np.min(last_control) - 1., np.max(last_control) + 1.)
-
-            self.house.draw(ax_environment)
-
-            artifact: Dict[str, Collection[Union[Cat, Laser]]] = self.render_artifacts[i]
-
-            cats: Collection[Cat] = artifact["cats"]
-            lasers: Collection[Laser] = artifact["lasers"]
-
-            for cat_artifact in cats: 
-                cat = cat_artifact["cat"]
-                cat.draw(ax_environment)
-
-                control_history = np.array(cat_artifact["control"])
-
-                ax_cats.plot(np.arange(min(i, len(control_history))) * self.timestep_duration, control_history[:i, 0])
-                ax_cats.plot(np.arange(min(i, len(control_history))) * self.timestep_duration, control_history[:i, 1])
-
-            for laser_artifact in lasers: 
-                laser = laser_artifact["laser"]
-                laser.draw(ax_environment)
-
-                control_history = np.array(laser_artifact["control"])
-
-                ax_lasers.plot(np.arange(min(i, len(control_history))) * self.timestep_duration, control_history[:i, 0])
-                ax_lasers.plot(np.arange(min(i, len(control_history))) * self.timestep_duration, control_history[:i, 1])
+            for k, line in enumerate(laser_lines): 
+                line.set_data(times[:i], laser_controls[:i, k // 2, k % 2])
 
             ax_environment.set_title(f"Environment (step: {i})")
-            ax_cats.set_title("Cat Control")
-            ax_lasers.set_title("Laser Control")
-            fig.tight_layout()
-            plt.subplots_adjust(left=left, bottom=bottom, right=right, top=top, wspace=wspace, hspace=hspace)
 
-            return fig,
+            return artists
 
-        animated = animation.FuncAnimation(fig, animate, init_func=init, frames=len(self.render_artifacts), interval=1, blit=True)
+        animated = animation.FuncAnimation(fig, animate, init_func=init, frames=num_frames, interval=1, blit=True)
         animated.save(save_path, fps=30, extra_args=['-vcodec', 'libx264'], writer='ffmpeg')
\ No newline at end of file
@@ -1,37 +1,43 @@
 from abc import ABC, abstractmethod
 import dataclasses 
-from typing import Collection, List, Optional, Sequence
+import inspect
+import math
+import weakref
+from typing import Callable, Collection, List, Optional, Sequence, Tuple
 
 import numpy as np
 
-from utils import normalize
-
 @dataclasses.dataclass
 class BoundarySegment: 
     endpoints: np.ndarray
     inside_normal: np.ndarray
 
+    def __post_init__(self) -> None: 
+        # the segment direction is invariant under translation 
+        self._v2: np.ndarray = self.endpoints[1] - self.endpoints[0]
+
     def ray_intersection(self, ray_origin: np.ndarray, ray_direction: np.ndarray) -> list: 
-        ray_direction = normalize(ray_direction)
-        
-        v1: np.ndarray = ray_origin - self.endpoints[0]
-        v2: np.ndarray = self.endpoints[1] - self.endpoints[0]
-        v3: np.ndarray = np.array([-ray_direction[1], ray_direction[0]])
+        norm: float = math.hypot(ray_direction[0], ray_direction[1])
+        dx: float = ray_direction[0] / norm 
+        dy: float = ray_direction[1] / norm 
 
+        v1x: float = ray_origin[0] - self.endpoints[0, 0]
+        v1y: float = ray_origin[1] - self.endpoints[0, 1]
+        v2x, v2y = self._v2
 
-        if np.dot(v2, v3) != 0.: 
-            t1: np.ndarray = np.cross(v2, v1) / np.dot(v2, v3)
-            t2: np.ndarray = np.dot(v1, v3) / np.dot(v2, v3)
-        else: 
-            t1 = -np.inf
-            t2 = -np.inf
+        # 2D cross/dot products against v3 = (-dy, dx)
+        denom: float = v2y * dx - v2x * dy
+
+        if abs(denom) < 1e-12: 
+            return []
 
-        intersections: List[np.ndarray] = []
+        t1: float = (v2x * v1y - v2y * v1x) / denom
+        t2: float = (v1y * dx - v1x * dy) / denom
 
         if t1 >= 0.0 and t2 >= 0.0 and t2 <= 1.0:
-            intersections.append(ray_origin + t1 * ray_direction)
+            return [ray_origin + t1 * np.array([dx, dy])]
 
-        return intersections
+        return []
 
     def translate(self, translation: np.ndarray) -> None: 
         self.endpoints += translation
@@ -39,11 +45,32 @@ class BoundarySegment:
     def draw(self, ax) -> None: 
         ax.plot(self.endpoints[0], self.endpoints[1], c="k")
 
+def _ray_distance(point: np.ndarray, direction: np.ndarray, wall_origins: np.ndarray, wall_directions: np.ndarray) -> float: 
+    # distance along the ray to the nearest of the (num_walls, 2) wall segments, np.inf if it hits none 
+    v1: np.ndarray = point - wall_origins
+    v3: np.ndarray = np.array([-direction[1], direction[0]])
+    denom: np.ndarray = wall_directions @ v3
+
+    with np.errstate(divide="ignore", invalid="ignore"): 
+        t1: np.ndarray = (wall_directions[:, 0] * v1[:, 1] - wall_directions[:, 1] * v1[:, 0]) / denom
+        t2: np.ndarray = (v1 @ v3) / denom
+
+    valid: np.ndarray = (np.abs(denom) >= 1e-12) & (t1 >= 0.) & (t2 >= 0.) & (t2 <= 1.)
+
+    if valid.any(): 
+        return t1[valid].min() * np.linalg.norm(direction)
+    else: 
+        return np.inf
+
 class VirtualRoom(ABC): 
     @abstractmethod
     def inside(self, point: np.ndarray) -> bool: 
         raise NotImplementedError
 
+    def inside_batch(self, points: np.ndarray) -> np.ndarray: 
+        # rooms can override this with a vectorized check 
+        return np.array([self.inside(point) for point in points], dtype=bool).reshape(-1)
+
     @abstractmethod 
     def distance_to_boundary(self, point: np.ndarray, direction: np.ndarray) -> float: 
         raise NotImplementedError
@@ -59,6 +86,7 @@ class ClosedRoom(VirtualRoom):
 
         self.half_width: float = self._width / 2. 
         self.half_height: float = self._height / 2.
+        self._half_extents: np.ndarray = np.array([self.half_width, self.half_height])
 
         self.bottom_left_corner: np.ndarray = np.array([-self.half_width, -self.half_height])
         self.bottom_right_corner: np.ndarray = np.array([self.half_width, -self.half_height])
@@ -79,6 +107,13 @@ class ClosedRoom(VirtualRoom):
             BoundarySegment(endpoints=np.array([self.top_left_corner, self.bottom_left_corner]), inside_normal=right), 
         ]
 
+        # (num_walls, 2) wall origins and directions for `distance_to_boundary`
+        self._wp0: np.ndarray = np.array([wall.endpoints[0] for wall in self._walls])
+        self._wv2: np.ndarray = np.array([wall.endpoints[1] - wall.endpoints[0] for wall in self._walls])
+
+        # weak references to callbacks made after every translation (see `add_translate_callback`)
+        self._translate_callbacks: List[weakref.ref] = []
+
     @property 
     def width(self) -> float: 
         return self._width 
@@ -91,28 +126,31 @@ class ClosedRoom(VirtualRoom):
         self.origin = translation 
         for wall in self._walls: 
             wall.translate(translation)
+        self._wp0 += translation
+
+        # callbacks whose owners have been garbage collected are dropped 
+        callbacks: List[Callable[[], None]] = [reference() for reference in self._translate_callbacks]
+        self._translate_callbacks = [reference for reference, callback in zip(self._translate_callbacks, callbacks) if callback is not None]
+        for callback in callbacks: 
+            if callback is not None: 
+                callback()
+
+    def add_translate_callback(self, callback: Callable[[], None]) -> None: 
+        # callbacks are held weakly, so e.g. a discarded `House` isn't kept alive (and updated) by its rooms 
+        reference: weakref.ref = weakref.WeakMethod(callback) if inspect.ismethod(callback) else weakref.ref(callback)
+        self._translate_callbacks.append(reference)
 
     def __repr__(self) -> str: 
         return f"{self.__class__.__name__}(origin={self.origin}, width={self.width}, heigh={self.height})"
 
     def inside(self, point: np.ndarray) -> bool: 
-        within_width: bool = (((point[0] - self.origin[0]) < self.half_width) and ((point[0] - self.origin[0]) > -self.half_width))
-        within_height: bool = (((point[1] - self.origin[1]) < self.half_height) and ((point[1] - self.origin[1]) > -self.half_height))
-        return (within_width and within_height)
-
-    def distance_to_boundary(self, point: np.ndarray, direction: np.ndarray) -> float: 
-        distances: list = [] 
+        return bool(np.all(np.abs(point - self.origin) < self._half_extents))
 
-        for wall in self._walls: 
-            intersection = wall.ray_intersection(point, direction)
+    def inside_batch(self, points: np.ndarray) -> np.ndarray: 
+        return np.all(np.abs(points - self.origin) < self._half_extents, axis=1)
 
-            if len(intersection) != 0: 
-                distances.append(np.linalg.norm(intersection[0] - point))
-
-        if len(distances) > 0: 
-            return min(distances)
-        else: 
-            return [np.inf]
+    def distance_to_boundary(self, point: np.ndarray, direction: np.ndarray) -> float: 
+        return _ray_distance(point, direction, self._wp0, self._wv2)
 
     def draw(self, ax) -> None: 
         for wall in self._walls: 
@@ -125,6 +163,25 @@ class House:
         else: 
             self._rooms = rooms
 
+        # closed rooms are checked all at once against stacked arrays, which are rebuilt whenever a room is translated 
+        self._vectorized: bool = all(isinstance(room, ClosedRoom) for room in self._rooms)
+
+        if self._vectorized: 
+            self._stack_rooms()
+            for room in self._rooms: 
+                room.add_translate_callback(self._stack_rooms)
+
+    def _stack_rooms(self) -> None: 
+        self._origins: np.ndarray = np.array([room.origin for room in self._rooms]).reshape(-1, 2)
+        self._halves: np.ndarray = np.array([room._half_extents for room in self._rooms]).reshape(-1, 2)
+        self._wp0: np.ndarray = np.concatenate([room._wp0 for room in self._rooms]).reshape(-1, 2)
+        self._wv2: np.ndarray = np.concatenate([room._wv2 for room in self._rooms]).reshape(-1, 2)
+
+    @property
+    def boxes(self) -> Optional[Tuple[np.ndarray, np.ndarray]]: 
+        """Stacked (origins, half extents) of the rooms, or None unless every room is a ClosedRoom."""
+        return (self._origins, self._halves) if self._vectorized else None
+
     def __repr__(self) -> str: 
         return ' '.join([self._rooms.__repr__()])
 
@@ -133,6 +190,9 @@ class House:
             room.draw(ax)
 
     def inside(self, point: np.ndarray) -> bool: 
+        if self._vectorized: 
+            return bool(np.any(np.all(np.abs(point - self._origins) < self._halves, axis=1)))
+
         is_inside: bool = False
 
         for room in self._rooms: 
@@ -140,7 +200,21 @@ class House:
 
         return is_inside
 
+    def inside_batch(self, points: np.ndarray) -> np.ndarray: 
+        if self._vectorized: 
+            return np.any(np.all(np.abs(points[:, None, :] - self._origins) < self._halves, axis=-1), axis=1)
+
+        is_inside: np.ndarray = np.zeros(len(points), dtype=bool)
+
+        for room in self._rooms: 
+            is_inside |= room.inside_batch(points)
+
+        return is_inside
+
     def distance_to_boundary(self, point: np.ndarray, direction: np.ndarray) -> float: 
+        if self._vectorized: 
+            return _ray_distance(point, direction, self._wp0, self._wv2)
+
         distance: float = np.inf
 
         for room in self._rooms: 